@@ -1,90 +1,194 @@
 #!/usr/bin/env python3
+import ctypes
+import json
 import os
 import re
+import shutil
 import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import List, Optional, Tuple, Set
+from functools import lru_cache
+from typing import FrozenSet, List, Optional, Tuple
 
 
-@dataclass
+_APLAY_RE = re.compile(rb"card\s+(\d+):\s+(\S+)\s+\[(.*?)\],\s+device\s+(\d+):\s+(.*?)\s+\[(.*?)\]")
+# Anchored so that e.g. "SUBFORMAT:" is not taken for "FORMAT:"
+_HW_RE = re.compile(rb"^(?P<kind>ACCESS|FORMAT|CHANNELS|RATE):[ \t]*(?P<val>[^\n]*)", re.MULTILINE)
+_RANGE_RE = re.compile(rb"\[(\d+)\s+(\d+)\]")
+_PROC_CARD_RE = re.compile(rb"\s*(\d+)\s+\[(\S+)\s*\]:\s*\S+\s*-\s*(.*)")
+_PROC_PCM_RE = re.compile(rb"(\d+)-(\d+):.*:\s*playback\s+\d+")
+
+# Candidate common params, in order of preference
+_PREFERRED_RATES = (48000, 44100, 96000, 32000)
+_PREFERRED_FORMATS = ("S16_LE", "S24_3LE", "S32_LE")
+
+# aplay is resolved once; LC_ALL=C keeps its output in the untranslated form the parsers expect
+_APLAY = shutil.which("aplay") or "/usr/bin/aplay"
+_SUB_ENV = {**os.environ, "LC_ALL": "C"}
+
+# dataclass(slots=True) needs Python 3.10+; older Pis still ship 3.9
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+# alsa-lib constants (alsa/pcm.h)
+_SND_PCM_STREAM_PLAYBACK = 0
+_SND_PCM_NONBLOCK = 0x1
+_SND_PCM_ACCESS_LAST = 4
+_SND_PCM_FORMAT_MAX = 64  # upper bound; unknown slots return a NULL name
+
+# Probed hw params are cached between runs, keyed by "<card_short>:<dev>";
+# each entry also records the card's identity (see card_ident)
+_CACHE_PATH = os.path.expanduser("~/.cache/gen_asound/hwparams.json")
+_CACHE_TTL = 3600  # seconds
+_cache_lock = threading.Lock()
+
+
+@dataclass(**_SLOTS)
 class AlsaCard:
     num: int
     short: str   # e.g. "A", "CODEC"
     desc: str    # e.g. "USB Audio CODEC"
     dev: int = 0
+    longname: str = ""  # e.g. "Burr-Brown from TI USB Audio CODEC at usb-...", if known
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class HwParams:
-    access: Set[str]
-    formats: Set[str]
+    access: FrozenSet[str]
+    formats: FrozenSet[str]
     rate_fixed: Optional[int]        # e.g. 48000 if fixed
     rate_range: Optional[Tuple[int, int]]  # (min, max) if range
     channels_fixed: Optional[int]
     channels_range: Optional[Tuple[int, int]]
 
 
-def run_cmd(cmd: List[str]) -> str:
-    p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+def run_cmd(cmd: List[str]) -> bytes:
+    # Raw bytes: the parsers only match ASCII, so skip decoding the whole buffer
+    if cmd[0] == "aplay":
+        cmd = [_APLAY, *cmd[1:]]
+    p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=_SUB_ENV)
     return p.stdout
 
 
-def parse_aplay_l(output: str) -> List[AlsaCard]:
+def parse_aplay_l(output: bytes) -> List[AlsaCard]:
     """
     Parse lines like:
     card 3: A [USB-C to 3.5mm Headphone Jack A], device 0: USB Audio [USB Audio]
     """
     cards: List[AlsaCard] = []
+    # Keep only the first device seen per card (often dev 0); aplay -l lists cards in order
+    seen = set()
     for line in output.splitlines():
-        m = re.match(r"card\s+(\d+):\s+(\S+)\s+\[(.*?)\],\s+device\s+(\d+):\s+(.*?)\s+\[(.*?)\]", line)
-        if m:
+        # Header and "Subdevice" lines are rejected here without touching the regex
+        if not line.startswith(b"card "):
+            continue
+        num_s, _, rest = line[5:].partition(b":")
+        if num_s.isdigit() and int(num_s) in seen:
+            continue
+        head, sep, tail = rest.partition(b", device ")
+        short, _, desc = head.strip().partition(b" [")
+        short = short.strip()
+        dev_s = tail.partition(b":")[0].strip()
+        if sep and num_s.isdigit() and short and desc.endswith(b"]") and dev_s.isdigit():
+            num = int(num_s)
+            desc = desc[:-1]
+            dev = int(dev_s)
+        else:
+            # Unusual spacing etc.: fall back to the full pattern
+            m = _APLAY_RE.match(line)
+            if not m:
+                continue
             num = int(m.group(1))
+            if num in seen:
+                continue
             short = m.group(2)
             desc = m.group(3)
             dev = int(m.group(4))
-            # Prefer device 0; we keep it for completeness
-            cards.append(AlsaCard(num=num, short=short, desc=desc, dev=dev))
-    # Deduplicate by card number; keep first device seen (often dev 0)
-    uniq = {}
-    for c in cards:
-        uniq.setdefault(c.num, c)
-    return [uniq[k] for k in sorted(uniq.keys())]
+        seen.add(num)
+        cards.append(AlsaCard(num=num, short=short.decode(), desc=desc.decode(errors="replace"), dev=dev))
+    return cards
 
 
-def parse_hw_params(output: str) -> HwParams:
-    # ACCESS
-    access = set()
-    m = re.search(r"ACCESS:\s+(.*)", output)
+def _parse_fixed_or_range(val: bytes) -> Tuple[Optional[int], Optional[Tuple[int, int]]]:
+    """
+    Parse a hw-params value like "48000" (fixed) or "[44100 96000]" (range).
+    """
+    val = val.strip()
+    m = _RANGE_RE.match(val)
     if m:
-        access = set(m.group(1).split())
+        return None, (int(m.group(1)), int(m.group(2)))
+    if val.isdigit():
+        return int(val), None
+    return None, None
 
-    # FORMAT
-    formats = set()
-    m = re.search(r"FORMAT:\s+(.*)", output)
-    if m:
-        formats = set(m.group(1).split())
 
-    # CHANNELS
+def list_cards_proc(proc_root: str = "/proc/asound") -> Optional[List[AlsaCard]]:
+    """
+    Read playback cards from /proc/asound instead of forking `aplay -l`.
+    /proc/asound/cards has lines like:
+     3 [A              ]: USB-Audio - USB-C to 3.5mm Headphone Jack A
+    and /proc/asound/pcm lines like:
+    03-00: USB Audio : USB Audio : playback 1 : capture 1
+    Capture-only cards are skipped; the lowest playback device of each card is used.
+    Returns None if procfs isn't available.
+    """
+    try:
+        with open(os.path.join(proc_root, "cards"), "rb") as f:
+            data = f.read()
+        with open(os.path.join(proc_root, "pcm"), "rb") as f:
+            pcm = f.read()
+    except OSError:
+        return None
+
+    playback = {}
+    for line in pcm.splitlines():
+        m = _PROC_PCM_RE.match(line)
+        if m:
+            num, dev = int(m.group(1)), int(m.group(2))
+            playback[num] = min(dev, playback.get(num, dev))
+
+    cards: List[AlsaCard] = []
+    lines = data.splitlines()
+    for i, line in enumerate(lines):
+        m = _PROC_CARD_RE.match(line)
+        if not m:
+            continue  # second (longname) line of each entry
+        num = int(m.group(1))
+        if num not in playback:
+            continue
+        longname = lines[i + 1].strip().decode(errors="replace") if i + 1 < len(lines) else ""
+        cards.append(AlsaCard(
+            num=num,
+            short=m.group(2).decode(),
+            desc=m.group(3).strip().decode(errors="replace"),
+            dev=playback[num],
+            longname=longname,
+        ))
+    return cards
+
+
+def parse_hw_params(output: bytes) -> HwParams:
+    access: FrozenSet[str] = frozenset()
+    formats: FrozenSet[str] = frozenset()
     channels_fixed = None
     channels_range = None
-    m = re.search(r"CHANNELS:\s+\[(\d+)\s+(\d+)\]", output)
-    if m:
-        channels_range = (int(m.group(1)), int(m.group(2)))
-    else:
-        m2 = re.search(r"CHANNELS:\s+(\d+)", output)
-        if m2:
-            channels_fixed = int(m2.group(1))
-
-    # RATE
     rate_fixed = None
     rate_range = None
-    m = re.search(r"RATE:\s+\[(\d+)\s+(\d+)\]", output)
-    if m:
-        rate_range = (int(m.group(1)), int(m.group(2)))
-    else:
-        m2 = re.search(r"RATE:\s+(\d+)", output)
-        if m2:
-            rate_fixed = int(m2.group(1))
+
+    # One scan over the dump, dispatching on which field matched
+    for m in _HW_RE.finditer(output):
+        key = m.group("kind")
+        val = m.group("val")
+        if key == b"ACCESS":
+            access = frozenset(a.decode() for a in val.split())
+        elif key == b"FORMAT":
+            formats = frozenset(f.decode() for f in val.split())
+        elif key == b"CHANNELS":
+            channels_fixed, channels_range = _parse_fixed_or_range(val)
+        elif key == b"RATE":
+            rate_fixed, rate_range = _parse_fixed_or_range(val)
 
     return HwParams(
         access=access,
@@ -96,48 +200,245 @@ def parse_hw_params(output: str) -> HwParams:
     )
 
 
-def dump_hw_params(card_short: str, dev: int = 0) -> HwParams:
-    # Using /dev/zero is fine; aplay will print HW params then fail, but params dump appears.
-    cmd = ["aplay", f"-D", f"hw:CARD={card_short},DEV={dev}", "--dump-hw-params", "-d 1", "/dev/zero"]
+@lru_cache(maxsize=None)
+def _load_alsa() -> Optional[ctypes.CDLL]:
+    try:
+        alsa = ctypes.CDLL("libasound.so.2", use_errno=True)
+    except OSError:
+        return None
+    vp = ctypes.c_void_p
+    puint = ctypes.POINTER(ctypes.c_uint)
+    pint = ctypes.POINTER(ctypes.c_int)
+    alsa.snd_pcm_open.argtypes = [ctypes.POINTER(vp), ctypes.c_char_p, ctypes.c_int, ctypes.c_int]
+    alsa.snd_pcm_close.argtypes = [vp]
+    alsa.snd_pcm_hw_params_malloc.argtypes = [ctypes.POINTER(vp)]
+    alsa.snd_pcm_hw_params_free.argtypes = [vp]
+    alsa.snd_pcm_hw_params_any.argtypes = [vp, vp]
+    alsa.snd_pcm_hw_params_test_access.argtypes = [vp, vp, ctypes.c_int]
+    alsa.snd_pcm_hw_params_test_format.argtypes = [vp, vp, ctypes.c_int]
+    alsa.snd_pcm_hw_params_get_rate_min.argtypes = [vp, puint, pint]
+    alsa.snd_pcm_hw_params_get_rate_max.argtypes = [vp, puint, pint]
+    alsa.snd_pcm_hw_params_get_channels_min.argtypes = [vp, puint]
+    alsa.snd_pcm_hw_params_get_channels_max.argtypes = [vp, puint]
+    alsa.snd_pcm_access_name.argtypes = [ctypes.c_int]
+    alsa.snd_pcm_access_name.restype = ctypes.c_char_p
+    alsa.snd_pcm_format_name.argtypes = [ctypes.c_int]
+    alsa.snd_pcm_format_name.restype = ctypes.c_char_p
+    return alsa
+
+
+def probe_hw_params_alsa(card_short: str, dev: int = 0) -> Optional[HwParams]:
+    """
+    Query the hw params space directly through alsa-lib (no aplay fork, no text parse).
+    Returns None if libasound is unavailable or the device cannot be opened.
+    """
+    alsa = _load_alsa()
+    if alsa is None:
+        return None
+
+    pcm = ctypes.c_void_p()
+    name = f"hw:CARD={card_short},DEV={dev}".encode()
+    if alsa.snd_pcm_open(ctypes.byref(pcm), name, _SND_PCM_STREAM_PLAYBACK, _SND_PCM_NONBLOCK) < 0:
+        return None
+    hw = ctypes.c_void_p()
+    try:
+        if alsa.snd_pcm_hw_params_malloc(ctypes.byref(hw)) < 0:
+            return None
+        if alsa.snd_pcm_hw_params_any(pcm, hw) < 0:
+            return None
+
+        access = set()
+        for a in range(_SND_PCM_ACCESS_LAST + 1):
+            if alsa.snd_pcm_hw_params_test_access(pcm, hw, a) == 0:
+                access.add(alsa.snd_pcm_access_name(a).decode())
+
+        formats = set()
+        for f in range(_SND_PCM_FORMAT_MAX):
+            fname = alsa.snd_pcm_format_name(f)
+            if fname and alsa.snd_pcm_hw_params_test_format(pcm, hw, f) == 0:
+                formats.add(fname.decode())
+
+        lo, hi, d = ctypes.c_uint(), ctypes.c_uint(), ctypes.c_int()
+        alsa.snd_pcm_hw_params_get_rate_min(hw, ctypes.byref(lo), ctypes.byref(d))
+        alsa.snd_pcm_hw_params_get_rate_max(hw, ctypes.byref(hi), ctypes.byref(d))
+        rate = (lo.value, hi.value)
+
+        alsa.snd_pcm_hw_params_get_channels_min(hw, ctypes.byref(lo))
+        alsa.snd_pcm_hw_params_get_channels_max(hw, ctypes.byref(hi))
+        channels = (lo.value, hi.value)
+    finally:
+        if hw:
+            alsa.snd_pcm_hw_params_free(hw)
+        alsa.snd_pcm_close(pcm)
+
+    # Same shape as the aplay dump: a single value is "fixed", otherwise a range
+    return HwParams(
+        access=frozenset(access),
+        formats=frozenset(formats),
+        rate_fixed=rate[0] if rate[0] == rate[1] else None,
+        rate_range=rate if rate[0] != rate[1] else None,
+        channels_fixed=channels[0] if channels[0] == channels[1] else None,
+        channels_range=channels if channels[0] != channels[1] else None,
+    )
+
+
+def _load_cache() -> dict:
+    try:
+        with open(_CACHE_PATH, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def _save_cache(cache: dict) -> None:
+    # Best effort: an unwritable cache dir must never break config generation
+    try:
+        os.makedirs(os.path.dirname(_CACHE_PATH), exist_ok=True)
+        tmp = _CACHE_PATH + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(cache, f, indent=2, sort_keys=True)
+        os.replace(tmp, _CACHE_PATH)
+    except OSError:
+        pass
+
+
+def _hw_params_to_json(p: HwParams) -> dict:
+    return {
+        "access": sorted(p.access),
+        "formats": sorted(p.formats),
+        "rate_fixed": p.rate_fixed,
+        "rate_range": list(p.rate_range) if p.rate_range else None,
+        "channels_fixed": p.channels_fixed,
+        "channels_range": list(p.channels_range) if p.channels_range else None,
+    }
+
+
+def _json_int(v) -> Optional[int]:
+    if v is None:
+        return None
+    if type(v) is not int:
+        raise ValueError(f"expected int, got {v!r}")
+    return v
+
+
+def _json_range(v) -> Optional[Tuple[int, int]]:
+    if v is None:
+        return None
+    if not isinstance(v, list) or len(v) != 2:
+        raise ValueError(f"expected [min, max], got {v!r}")
+    return (_json_int(v[0]), _json_int(v[1]))
+
+
+def _json_names(v) -> FrozenSet[str]:
+    if not isinstance(v, list) or not all(isinstance(x, str) for x in v):
+        raise ValueError(f"expected list of names, got {v!r}")
+    return frozenset(v)
+
+
+def _hw_params_from_json(d: dict) -> HwParams:
+    # Cache files are user-writable; anything off-shape raises ValueError (treated as a miss)
+    if not isinstance(d, dict):
+        raise ValueError(f"expected object, got {d!r}")
+    return HwParams(
+        access=_json_names(d["access"]),
+        formats=_json_names(d["formats"]),
+        rate_fixed=_json_int(d["rate_fixed"]),
+        rate_range=_json_range(d["rate_range"]),
+        channels_fixed=_json_int(d["channels_fixed"]),
+        channels_range=_json_range(d["channels_range"]),
+    )
+
+
+def card_ident(c: AlsaCard) -> str:
+    """
+    What distinguishes this physical card beyond its ALSA id: cheap dongles
+    often share generic ids like "Device", so a swapped DAC must not hit the cache.
+    """
+    return c.longname or c.desc
+
+
+def prune_cache(cards: List[AlsaCard]) -> None:
+    """Drop cached entries for cards that are no longer present (or were swapped)."""
+    idents = {c.short: card_ident(c) for c in cards}
+    with _cache_lock:
+        cache = _load_cache()
+        kept = {
+            k: v for k, v in cache.items()
+            if isinstance(v, dict) and v.get("ident") == idents.get(k.rpartition(":")[0])
+        }
+        if len(kept) != len(cache):
+            _save_cache(kept)
+
+
+def _probe_hw_params(card_short: str, dev: int) -> HwParams:
+    params = probe_hw_params_alsa(card_short, dev)
+    if params is not None:
+        return params
+    # Fallback without libasound: using /dev/zero is fine; aplay will print HW params then fail, but params dump appears.
+    # If the device does accept aplay's default params, "-s 1" stops playback after a single sample.
+    cmd = ["aplay", "-D", f"hw:CARD={card_short},DEV={dev}", "--dump-hw-params", "-s", "1", "/dev/zero"]
     out = run_cmd(cmd)
-    print(out)
+    sys.stdout.flush()
+    sys.stdout.buffer.write(out + b"\n")
     return parse_hw_params(out)
 
 
+def _is_usable(p: HwParams) -> bool:
+    # A busy/failed probe parses to empty params; those must not be cached
+    return bool(p.formats) and (p.rate_fixed is not None or p.rate_range is not None)
+
+
+def dump_hw_params(card_short: str, dev: int = 0, ident: str = "") -> HwParams:
+    key = f"{card_short}:{dev}"
+    with _cache_lock:
+        entry = _load_cache().get(key)
+    if isinstance(entry, dict) and entry.get("ident") == ident:
+        try:
+            # A timestamp in the future (clock set back, e.g. a Pi without RTC before NTP sync) is stale too
+            if 0 <= time.time() - entry.get("ts", 0) < _CACHE_TTL:
+                params = _hw_params_from_json(entry["params"])
+                if _is_usable(params):
+                    return params
+        except (AttributeError, KeyError, TypeError, ValueError):
+            pass  # stale/corrupt entry, probe again
+
+    params = _probe_hw_params(card_short, dev)
+    if _is_usable(params):
+        with _cache_lock:
+            cache = _load_cache()
+            cache[key] = {"ts": time.time(), "ident": ident, "params": _hw_params_to_json(params)}
+            _save_cache(cache)
+    return params
+
+
+def _rate_bounds(p: HwParams) -> Optional[Tuple[int, int]]:
+    """
+    The card's rate support as an inclusive (min, max); a fixed rate is (r, r).
+    """
+    if p.rate_fixed is not None:
+        return (p.rate_fixed, p.rate_fixed)
+    return p.rate_range
+
+
 def choose_common_rate(p1: HwParams, p2: HwParams) -> Optional[int]:
     """
     Prefer 48000, else 44100, else 32000, else pick any integer in overlap.
     NOTE: Many USB dongles don't support 44100 in hw mode; 48000 is often safest.
     """
-    preferred = [48000, 44100, 96000, 32000]
-
-    def supports(p: HwParams, rate: int) -> bool:
-        if p.rate_fixed is not None:
-            return p.rate_fixed == rate
-        if p.rate_range is not None:
-            lo, hi = p.rate_range
-            return lo <= rate <= hi
-        return False
-
-    for r in preferred:
-        if supports(p1, r) and supports(p2, r):
-            return r
-
-    # If no preferred match, try to pick something in range overlap
-    # Fixed vs range / range vs range:
-    def get_range(p: HwParams) -> Optional[Tuple[int, int]]:
-        if p.rate_fixed is not None:
-            return (p.rate_fixed, p.rate_fixed)
-        return p.rate_range
-
-    r1 = get_range(p1)
-    r2 = get_range(p2)
+    # Resolve fixed vs range once per card; a rate both support is one in the overlap
+    r1 = _rate_bounds(p1)
+    r2 = _rate_bounds(p2)
     if not r1 or not r2:
         return None
     lo = max(r1[0], r2[0])
     hi = min(r1[1], r2[1])
     if lo > hi:
         return None
+
+    for r in _PREFERRED_RATES:
+        if lo <= r <= hi:
+            return r
     # pick lo as a valid candidate
     return lo
 
@@ -149,19 +450,18 @@ def choose_common_format(p1: HwParams, p2: HwParams) -> Optional[str]:
     common = p1.formats.intersection(p2.formats)
     if not common:
         return None
-    for f in ["S16_LE", "S24_3LE", "S32_LE"]:
+    for f in _PREFERRED_FORMATS:
         if f in common:
             return f
-    return sorted(common)[0]
+    return min(common)
 
 
-def generate_asound_conf(cardA: AlsaCard, cardB: AlsaCard, rate: int, fmt: str) -> str:
-    # Map ch0-1 -> A, ch2-3 -> B
-    return f"""# ============================================================
+# Map ch0-1 -> A, ch2-3 -> B
+_ASOUND_TEMPLATE = """# ============================================================
 # Auto-generated ALSA config: virtual 4ch device from two stereo devices
 #
-# Device A: card {cardA.num} ({cardA.short})  -> hw:CARD={cardA.short},DEV={cardA.dev}
-# Device B: card {cardB.num} ({cardB.short})  -> hw:CARD={cardB.short},DEV={cardB.dev}
+# Device A: card {cardA_num} ({cardA_short})  -> hw:CARD={cardA_short},DEV={cardA_dev}
+# Device B: card {cardB_num} ({cardB_short})  -> hw:CARD={cardB_short},DEV={cardB_dev}
 #
 # Mapping:
 #   ch0-1 -> Device A (L/R)
@@ -176,10 +476,10 @@ pcm.both {{
   slave.pcm {{
     type multi;
 
-    slaves.a.pcm "hw:CARD={cardA.short},DEV={cardA.dev}";
+    slaves.a.pcm "hw:CARD={cardA_short},DEV={cardA_dev}";
     slaves.a.channels 2;
 
-    slaves.b.pcm "hw:CARD={cardB.short},DEV={cardB.dev}";
+    slaves.b.pcm "hw:CARD={cardB_short},DEV={cardB_dev}";
     slaves.b.channels 2;
 
     bindings.0.slave a; bindings.0.channel 0;
@@ -187,7 +487,7 @@ pcm.both {{
     bindings.2.slave b; bindings.2.channel 0;
     bindings.3.slave b; bindings.3.channel 1;
 
-    hint {{ description "Combo HW ({cardA.short}+{cardB.short}) raw 4ch" }}
+    hint {{ description "Combo HW ({cardA_short}+{cardB_short}) raw 4ch" }}
   }}
 
   ttable.0.0 1;
@@ -198,7 +498,7 @@ pcm.both {{
 
 ctl.both {{
   type hw;
-  card {cardA.short};
+  card {cardA_short};
 }}
 
 pcm.convert4 {{
@@ -214,41 +514,69 @@ pcm.convert4 {{
 """
 
 
+def _asound_params(cardA: AlsaCard, cardB: AlsaCard, rate: int, fmt: str) -> dict:
+    return {
+        "cardA_num": cardA.num,
+        "cardA_short": cardA.short,
+        "cardA_dev": cardA.dev,
+        "cardB_num": cardB.num,
+        "cardB_short": cardB.short,
+        "cardB_dev": cardB.dev,
+        "rate": rate,
+        "fmt": fmt,
+    }
+
+
+def generate_asound_conf(cardA: AlsaCard, cardB: AlsaCard, rate: int, fmt: str) -> str:
+    return _ASOUND_TEMPLATE.format_map(_asound_params(cardA, cardB, rate, fmt))
+
+
 def pick_two_cards(cards: List[AlsaCard]) -> Tuple[AlsaCard, AlsaCard]:
-    print("\nDetected ALSA playback cards from `aplay -l`:")
+    print("\nDetected ALSA playback cards:")
     for c in cards:
         print(f"  [{c.num}] short='{c.short}' dev={c.dev}  desc='{c.desc}'")
 
+    by_num = {c.num: c for c in cards}
+
     def ask(prompt: str) -> int:
         while True:
             s = input(prompt).strip()
-            if s.isdigit():
-                return int(s)
-            print("Please enter a numeric card number.")
+            try:
+                n = int(s)
+            except ValueError:
+                print("Please enter a numeric card number.")
+                continue
+            if n not in by_num:
+                print(f"Card {n} is not in the list; choose from {sorted(by_num)}.")
+                continue
+            return n
 
     n1 = ask("\nEnter the FIRST card number to combine (e.g., 3): ")
     n2 = ask("Enter the SECOND card number to combine (e.g., 4): ")
     if n1 == n2:
         raise SystemExit("You must choose two different cards.")
 
-    by_num = {c.num: c for c in cards}
-    if n1 not in by_num or n2 not in by_num:
-        raise SystemExit("One of the card numbers is not in the list.")
     return by_num[n1], by_num[n2]
 
 
 def main():
-    aplay_l = run_cmd(["aplay", "-l"])
-    cards = parse_aplay_l(aplay_l)
+    cards = list_cards_proc()
+    if cards is None or len(cards) < 2:
+        # No procfs, or it didn't show enough playback cards: ask aplay
+        cards = parse_aplay_l(run_cmd(["aplay", "-l"]))
 
     if len(cards) < 2:
-        raise SystemExit("Need at least 2 playback cards from `aplay -l`.")
+        raise SystemExit("Need at least 2 playback cards (see `aplay -l`).")
+    prune_cache(cards)
 
     cardA, cardB = pick_two_cards(cards)
 
     print("\nProbing hardware capabilities (this may print some ALSA warnings)...")
-    pA = dump_hw_params(cardA.short, cardA.dev)
-    pB = dump_hw_params(cardB.short, cardB.dev)
+    # Each probe blocks on aplay opening the device; run both at once
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        fA = ex.submit(dump_hw_params, cardA.short, cardA.dev, card_ident(cardA))
+        fB = ex.submit(dump_hw_params, cardB.short, cardB.dev, card_ident(cardB))
+        pA, pB = fA.result(), fB.result()
 
     rate = choose_common_rate(pA, pB)
     fmt = choose_common_format(pA, pB)
@@ -267,8 +595,9 @@ def main():
 
     out_path = "/etc/asound.conf"
     out_preview = "./asound.conf.generated"
-    with open(out_preview, "w", encoding="utf-8") as f:
-        f.write(conf)
+    # ALSA card ids are ASCII, so the rendered config is too
+    with open(out_preview, "wb") as f:
+        f.write(conf.encode("ascii"))
 
     print(f"\nGenerated config written to: {out_preview}")
     print("To install it system-wide, run:")